@@ -9,16 +9,35 @@ and optional Docker stats monitoring.
 """
 
 import asyncio
+import http.client
+import itertools
+import math
+import multiprocessing
+import os
+import re
 import time
 import json
+import logging
+import socket
 import subprocess
 import sys
 import threading
-from typing import List, Dict, Any, Optional
+import urllib.parse
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Sequence, Set, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 import click
+import numpy as np
+
+try:
+    import uvloop
+except ImportError:  # Optional: fall back to the stock asyncio event loop
+    uvloop = None
+
+logger = logging.getLogger(__name__)
 
 
 class ErrorType(Enum):
@@ -30,23 +49,169 @@ class ErrorType(Enum):
     OTHER = "other"
 
 
+# SMTP reply codes, compared against the first three bytes of a reply line
+REPLY_READY = b'220'
+REPLY_OK = b'250'
+REPLY_START_DATA = b'354'
+REPLY_CLOSING = b'421'
+
+# SMTP commands the generator sends, encoded once. The pipelined groups are
+# pre-joined so a whole envelope (or end-of-data plus QUIT) is one write.
+CMD_EHLO = b'EHLO loadgen.test\r\n'
+CMD_MAIL_FROM = b'MAIL FROM:<loadgen@test.local>\r\n'
+CMD_RCPT_TO = b'RCPT TO:<test@example.com>\r\n'
+CMD_DATA = b'DATA\r\n'
+CMD_RSET = b'RSET\r\n'
+CMD_QUIT = b'QUIT\r\n'
+# Generated bodies always end in CRLF, so this completes the CRLF.CRLF
+END_OF_DATA = b'.\r\n'
+PIPELINED_ENVELOPE = CMD_MAIL_FROM + CMD_RCPT_TO + CMD_DATA
+PIPELINED_RESET_ENVELOPE = CMD_RSET + PIPELINED_ENVELOPE
+END_OF_DATA_QUIT = END_OF_DATA + CMD_QUIT
+# (command, expected reply code) for each reply to a pipelined envelope
+PIPELINED_REPLIES = (('MAIL FROM', REPLY_OK), ('RCPT TO', REPLY_OK), ('DATA', REPLY_START_DATA))
+PIPELINED_RESET_REPLIES = (('RSET', REPLY_OK),) + PIPELINED_REPLIES
+
+# Just under 4 KiB of short filler lines, repeated to pad message bodies to size
+FILLER_TILE = b''.join(b"Line %d of test message body content.\r\n" % n for n in range(1, 101))
+
+# SMTP error codes that mark an exception as a protocol error
+PROTOCOL_ERROR_RE = re.compile(r'\b(?:500|501|503|550)\b')
+
+# Seconds to wait for each server reply
+REPLY_TIMEOUT = 5.0
+
+# Seconds a session may sit unused before it is closed instead of reused;
+# well inside PrixFixe's 60s command timeout
+SESSION_IDLE_TIMEOUT = 30.0
+
+# Latency percentiles reported in the summary and JSON output
+REPORTED_PERCENTILES = (50, 90, 95, 99, 99.9)
+
+# asyncio's default StreamReader limit and write high-water mark
+MIN_STREAM_BUFFER = 64 * 1024
+
+# Outcome of a single send: (ok, bytes_sent, elapsed_seconds, error_kind).
+# error_kind is set only for connection-level failures, not SMTP rejections.
+SendResult = Tuple[bool, int, float, Optional[ErrorType]]
+
+
+class LatencySketch:
+    """
+    Streaming quantile sketch for latency samples
+
+    Samples are counted in logarithmic buckets whose width grows with the
+    value (DDSketch-style), so each quantile is within relative_accuracy of
+    the true sample and memory depends on the spread of latencies rather
+    than on how many were recorded. Count, sum, min and max are exact.
+
+    Bucketing is deferred: samples are buffered and assigned to buckets a
+    batch at a time in one NumPy pass, so recording a sample is little more
+    than a list append.
+    """
+
+    # Smallest value given its own bucket; anything below is clamped to it
+    MIN_VALUE = 1e-9
+    # Samples buffered before they are bucketed
+    BATCH_SIZE = 1024
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        # Multiplying by this is cheaper than dividing by _log_gamma per sample
+        self._key_scale = 1 / self._log_gamma
+        self.buckets: Dict[int, int] = {}
+        self._pending: List[float] = []
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, value: float):
+        """Record one sample"""
+        pending = self._pending
+        pending.append(value)
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(pending) >= self.BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        """Bucket the buffered samples"""
+        if not self._pending:
+            return
+        values = np.maximum(np.array(self._pending, dtype=np.float64), self.MIN_VALUE)
+        keys, counts = np.unique(np.ceil(np.log(values) * self._key_scale).astype(np.int64),
+                                 return_counts=True)
+        buckets = self.buckets
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+        self._pending.clear()
+
+    def merge(self, other: 'LatencySketch'):
+        """Fold another sketch with the same accuracy into this one"""
+        self._flush()
+        other._flush()
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, p: float) -> float:
+        """Estimate the p-th percentile (0-100) of the recorded samples"""
+        return self.quantiles((p,))[0]
+
+    def quantiles(self, ps: Sequence[float]) -> List[float]:
+        """Estimate several percentiles with one sort and one cumulative scan"""
+        if not self.count:
+            return [0.0] * len(ps)
+        self._flush()
+        keys = np.fromiter(self.buckets.keys(), dtype=np.int64, count=len(self.buckets))
+        counts = np.fromiter(self.buckets.values(), dtype=np.int64, count=len(self.buckets))
+        order = np.argsort(keys)
+        keys, counts = keys[order], counts[order]
+        ranks = np.asarray(ps, dtype=np.float64) / 100.0 * (self.count - 1)
+        indices = np.searchsorted(np.cumsum(counts), ranks, side='right')
+        # Bucket midpoints in the relative-error sense, kept inside the exact range
+        values = 2 * self._gamma ** keys[indices].astype(np.float64) / (self._gamma + 1)
+        return np.clip(values, self.min, self.max).tolist()
+
+
 @dataclass
 class TestMetrics:
     """Metrics collected during stress test"""
     total_messages: int = 0
     successful_messages: int = 0
     failed_messages: int = 0
+    dropped_messages: int = 0
     connection_errors: int = 0
     total_bytes_sent: int = 0
     start_time: float = 0.0
     end_time: float = 0.0
-    response_times: List[float] = field(default_factory=list)
+    # perf_counter() readings taken alongside the wall-clock times above;
+    # the duration comes from these so a clock step can't skew it
+    start_clock: float = 0.0
+    end_clock: float = 0.0
+    # Fixed-size summary of latencies rather than every sample
+    response_times: LatencySketch = field(default_factory=LatencySketch)
     error_breakdown: Dict[str, int] = field(default_factory=dict)
     docker_stats: List[Dict[str, Any]] = field(default_factory=list)
+    _percentile_cache: Optional[Tuple[int, Dict[float, float]]] = field(
+        default=None, init=False, repr=False, compare=False)
 
     @property
     def duration(self) -> float:
-        return self.end_time - self.start_time if self.end_time > 0 else 0.0
+        return self.end_clock - self.start_clock if self.end_clock > 0 else 0.0
 
     @property
     def messages_per_second(self) -> float:
@@ -54,59 +219,96 @@ class TestMetrics:
 
     @property
     def avg_response_time(self) -> float:
-        return sum(self.response_times) / len(self.response_times) if self.response_times else 0.0
+        return self.response_times.sum / self.response_times.count if self.response_times else 0.0
 
     @property
     def min_response_time(self) -> float:
-        return min(self.response_times) if self.response_times else 0.0
+        return self.response_times.min if self.response_times else 0.0
 
     @property
     def max_response_time(self) -> float:
-        return max(self.response_times) if self.response_times else 0.0
+        return self.response_times.max if self.response_times else 0.0
 
     def percentile(self, p: float) -> float:
-        """Calculate the p-th percentile of response times"""
-        if not self.response_times:
-            return 0.0
-        sorted_times = sorted(self.response_times)
-        k = (len(sorted_times) - 1) * (p / 100.0)
-        f = int(k)
-        c = f + 1 if f + 1 < len(sorted_times) else f
-        if f == c:
-            return sorted_times[int(k)]
-        return sorted_times[f] * (c - k) + sorted_times[c] * (k - f)
+        """Estimate the p-th percentile of response times"""
+        return self.response_times.quantile(p)
+
+    def latency_percentiles(self) -> Dict[float, float]:
+        """All REPORTED_PERCENTILES, cached until new samples arrive"""
+        count = len(self.response_times)
+        if self._percentile_cache is None or self._percentile_cache[0] != count:
+            values = self.response_times.quantiles(REPORTED_PERCENTILES)
+            self._percentile_cache = (count, dict(zip(REPORTED_PERCENTILES, values)))
+        return self._percentile_cache[1]
 
     @property
     def p50_response_time(self) -> float:
-        return self.percentile(50)
+        return self.latency_percentiles()[50]
 
     @property
     def p90_response_time(self) -> float:
-        return self.percentile(90)
+        return self.latency_percentiles()[90]
 
     @property
     def p95_response_time(self) -> float:
-        return self.percentile(95)
+        return self.latency_percentiles()[95]
 
     @property
     def p99_response_time(self) -> float:
-        return self.percentile(99)
+        return self.latency_percentiles()[99]
 
     @property
     def p999_response_time(self) -> float:
-        return self.percentile(99.9)
+        return self.latency_percentiles()[99.9]
+
+    def mark_start(self):
+        """Record the start of the test"""
+        self.start_time = time.time()
+        self.start_clock = time.perf_counter()
+
+    def mark_end(self):
+        """Record the end of the test"""
+        self.end_time = time.time()
+        self.end_clock = time.perf_counter()
+
+    def record_result(self, result: SendResult):
+        """Count the outcome of one send"""
+        ok, bytes_sent, elapsed, error_kind = result
+        self.total_messages += 1
+        if ok:
+            self.successful_messages += 1
+            self.total_bytes_sent += bytes_sent
+            self.response_times.add(elapsed)
+        else:
+            self.failed_messages += 1
+            if error_kind is not None:
+                self.connection_errors += 1
+                self.record_error(error_kind)
 
     def record_error(self, error_type: ErrorType):
         """Record an error by type"""
         key = error_type.value
         self.error_breakdown[key] = self.error_breakdown.get(key, 0) + 1
 
+    def merge(self, other: 'TestMetrics'):
+        """Fold counters and samples gathered elsewhere into these metrics"""
+        self.total_messages += other.total_messages
+        self.successful_messages += other.successful_messages
+        self.failed_messages += other.failed_messages
+        self.dropped_messages += other.dropped_messages
+        self.connection_errors += other.connection_errors
+        self.total_bytes_sent += other.total_bytes_sent
+        self.response_times.merge(other.response_times)
+        for key, count in other.error_breakdown.items():
+            self.error_breakdown[key] = self.error_breakdown.get(key, 0) + count
+
     def to_dict(self) -> Dict[str, Any]:
         """Convert metrics to dictionary for JSON serialization"""
         result = {
             'total_messages': self.total_messages,
             'successful_messages': self.successful_messages,
             'failed_messages': self.failed_messages,
+            'dropped_messages': self.dropped_messages,
             'connection_errors': self.connection_errors,
             'total_bytes_sent': self.total_bytes_sent,
             'duration_seconds': self.duration,
@@ -133,305 +335,779 @@ class TestMetrics:
         return result
 
     def _summarize_docker_stats(self) -> Dict[str, Any]:
-        """Summarize docker stats across all samples"""
+        """Summarize docker stats across all samples
+
+        Values are laid out as (container, sample) arrays with NaN where a
+        container is missing from a sample, so every reduction is a single
+        NumPy call along the sample axis.
+        """
         if not self.docker_stats:
             return {}
 
-        summary = {}
-        containers = set()
+        containers: Dict[str, int] = {}
         for sample in self.docker_stats:
+            for container in sample.get('containers', {}):
+                containers.setdefault(container, len(containers))
+
+        shape = (len(containers), len(self.docker_stats))
+        mem_usages = np.full(shape, np.nan)
+        cpu_usages = np.full(shape, np.nan)
+        for column, sample in enumerate(self.docker_stats):
             for container, stats in sample.get('containers', {}).items():
-                containers.add(container)
-
-        for container in containers:
-            mem_usages = []
-            cpu_usages = []
-            for sample in self.docker_stats:
-                if container in sample.get('containers', {}):
-                    stats = sample['containers'][container]
-                    if 'mem_usage_mb' in stats:
-                        mem_usages.append(stats['mem_usage_mb'])
-                    if 'cpu_percent' in stats:
-                        cpu_usages.append(stats['cpu_percent'])
-
-            summary[container] = {
-                'memory_mb': {
-                    'min': min(mem_usages) if mem_usages else 0,
-                    'max': max(mem_usages) if mem_usages else 0,
-                    'avg': sum(mem_usages) / len(mem_usages) if mem_usages else 0,
-                },
-                'cpu_percent': {
-                    'min': min(cpu_usages) if cpu_usages else 0,
-                    'max': max(cpu_usages) if cpu_usages else 0,
-                    'avg': sum(cpu_usages) / len(cpu_usages) if cpu_usages else 0,
-                }
+                row = containers[container]
+                mem_usages[row, column] = stats.get('mem_usage_mb', np.nan)
+                cpu_usages[row, column] = stats.get('cpu_percent', np.nan)
+
+        mem = self._nan_summary(mem_usages)
+        cpu = self._nan_summary(cpu_usages)
+        return {
+            container: {
+                'memory_mb': {'min': mem[0][row], 'max': mem[1][row], 'avg': mem[2][row]},
+                'cpu_percent': {'min': cpu[0][row], 'max': cpu[1][row], 'avg': cpu[2][row]},
             }
-        return summary
+            for container, row in containers.items()
+        }
 
+    @staticmethod
+    def _nan_summary(values: np.ndarray) -> Tuple[List[float], List[float], List[float]]:
+        """Per-row (min, max, avg) ignoring NaNs; 0 for a row with no values"""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN rows
+            reductions = (np.nanmin(values, axis=1), np.nanmax(values, axis=1),
+                          np.nanmean(values, axis=1))
+        return tuple(np.nan_to_num(reduction, nan=0.0).tolist() for reduction in reductions)
+
+
+@dataclass
+class SMTPSession:
+    """An open SMTP connection that has completed EHLO"""
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    pipelining: bool = False
+    messages_sent: int = 0
+    reset_pending: bool = False
+    quit_sent: bool = False
+    # perf_counter() when the session last finished a transaction
+    last_used: float = field(default_factory=time.perf_counter)
+
+
+class SessionExpired(Exception):
+    """A reused session was closed by the server before the envelope was accepted"""
 
-class DockerStatsCollector:
-    """Collects Docker stats in background"""
 
-    def __init__(self, container_filter: str = "prixfixe-smtp"):
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a unix socket, for the Docker Engine API"""
+
+    def __init__(self, socket_path: str, timeout: float = 5.0):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class DockerStatsCollector:
+    """Collects Docker stats in background
+
+    Where the containers' cgroup v2 directories are readable (Linux hosts),
+    memory and CPU usage are read straight from sysfs, which costs next to
+    nothing and doesn't load dockerd. Failing that, if the Docker socket is
+    reachable (Docker Desktop, or the socket mounted into this container),
+    each sample is a set of parallel one-shot stats requests to the Engine
+    API. Otherwise a single streaming `docker stats` process runs for the
+    whole test; a reader thread keeps the latest figures per container and
+    the sampling thread snapshots whatever has refreshed. Whichever source
+    is used, memory excludes the page cache's inactive files, as docker
+    stats shows it.
+    """
+
+    DOCKER_SOCKET = '/var/run/docker.sock'
+
+    CGROUP_ROOT = '/sys/fs/cgroup'
+    # A container's cgroup directory under the systemd and cgroupfs drivers
+    CGROUP_DIRS = ('system.slice/docker-{id}.scope', 'docker/{id}')
+
+    STATS_COMMAND = ['docker', 'stats', '--format', '{{.Name}}\t{{.CPUPerc}}\t{{.MemUsage}}']
+
+    # Leading usage figure of a MemUsage column, e.g. b"50.5MiB / 1GiB"
+    _MEM_RE = re.compile(rb'([\d.]+)\s*(KiB|MiB|GiB)')
+    # Unit -> multiplier to MiB
+    _MEM_MULT = {b'KiB': 1 / 1024, b'MiB': 1.0, b'GiB': 1024.0}
+    # Terminal control sequences the streaming output uses to redraw its table
+    _ANSI_RE = re.compile(rb'\x1b\[[0-9;]*[A-Za-z]')
+
+    def __init__(self, container_filter: str = "prixfixe-smtp", sample_interval: float = 1.0):
         self.container_filter = container_filter
+        self.sample_interval = sample_interval
+        self._filter_bytes = container_filter.encode()
         self.stats: List[Dict[str, Any]] = []
-        self.running = False
         self.thread: Optional[threading.Thread] = None
+        self._reader: Optional[threading.Thread] = None
+        self._process: Optional[subprocess.Popen] = None
+        # Container name -> figures refreshed since the last snapshot
+        self._latest: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        # Container name -> cgroup directory, when sysfs can be read directly
+        self._cgroups: Dict[str, str] = {}
+        # Container name -> (usage_usec, monotonic time) at the previous read
+        self._cpu_prev: Dict[str, Tuple[int, float]] = {}
+        # Container name -> ID, when stats come from the Engine API
+        self._api_containers: Dict[str, str] = {}
+        # Container name -> (total_usage, system_cpu_usage) at the previous request
+        self._api_cpu_prev: Dict[str, Tuple[int, int]] = {}
+        self._api_pool: Optional[ThreadPoolExecutor] = None
+        self._sample_source = self._collect_sample
 
     def start(self):
         """Start collecting stats in background"""
-        self.running = True
         self.thread = threading.Thread(target=self._collect_loop, daemon=True)
         self.thread.start()
 
     def stop(self) -> List[Dict[str, Any]]:
         """Stop collecting and return stats"""
-        self.running = False
+        with self._lock:
+            self._stopped.set()
+            process = self._process
+        if process:
+            process.terminate()
+            try:
+                process.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                process.kill()
         if self.thread:
             self.thread.join(timeout=2.0)
+        if self._reader:
+            self._reader.join(timeout=2.0)
         return self.stats
 
-    def _collect_loop(self):
-        """Background collection loop"""
-        while self.running:
+    def _api_get(self, path: str) -> Any:
+        """GET a Docker Engine API path and decode its JSON body"""
+        connection = _UnixHTTPConnection(self.DOCKER_SOCKET)
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            body = response.read()
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise OSError(f"Docker API returned {response.status} for {path}")
+        return json.loads(body)
+
+    def _find_api_containers(self) -> bool:
+        """Look up matching containers through the Engine API, if reachable"""
+        filters = urllib.parse.quote(json.dumps({'name': [self.container_filter]}))
+        try:
+            containers = self._api_get(f'/containers/json?filters={filters}')
+        except (OSError, ValueError, http.client.HTTPException):
+            return False
+        self._api_containers = {c['Names'][0].lstrip('/'): c['Id'] for c in containers if c['Names']}
+        return bool(self._api_containers)
+
+    def _api_collect(self) -> Optional[Dict[str, Any]]:
+        """Fetch one-shot stats for every container in parallel
+
+        With one-shot=true the daemon answers straight away instead of
+        waiting a second to fill in precpu_stats, so CPU percent is worked
+        out here against the previous request, the way docker stats does.
+        """
+        futures = {name: self._api_pool.submit(
+                       self._api_get, f'/containers/{container_id}/stats?stream=false&one-shot=true')
+                   for name, container_id in self._api_containers.items()}
+
+        containers = {}
+        for name, future in futures.items():
             try:
-                sample = self._collect_sample()
-                if sample:
-                    self.stats.append(sample)
-            except Exception as e:
-                pass  # Silently ignore collection errors
-            time.sleep(1.0)  # Sample every second
+                stats = future.result()
+                cpu_stats = stats['cpu_stats']
+                total_usage = cpu_stats['cpu_usage']['total_usage']
+                system_usage = cpu_stats['system_cpu_usage']
+                memory = stats['memory_stats']
+                mem_details = memory.get('stats', {})
+                mem_bytes = memory['usage'] - mem_details.get(
+                    'inactive_file', mem_details.get('total_inactive_file', 0))
+            except (OSError, ValueError, KeyError, http.client.HTTPException):
+                continue  # Container stopped since start()
+            previous = self._api_cpu_prev.get(name)
+            self._api_cpu_prev[name] = (total_usage, system_usage)
+            if previous is None:
+                continue
+            system_delta = system_usage - previous[1]
+            online_cpus = cpu_stats.get('online_cpus') or 1
+            containers[name] = {
+                'cpu_percent': ((total_usage - previous[0]) / system_delta * online_cpus * 100
+                                if system_delta > 0 else 0.0),
+                'mem_usage_mb': mem_bytes / (1024 * 1024)
+            }
 
-    def _collect_sample(self) -> Optional[Dict[str, Any]]:
-        """Collect a single stats sample"""
+        if not containers:
+            return None
+        return {'timestamp': time.time(), 'containers': containers}
+
+    def _find_cgroups(self) -> Dict[str, str]:
+        """Map each matching container to its cgroup directory
+
+        Returns an empty dict unless every container's directory is
+        readable, so a partial view never replaces the docker stats fallback.
+        """
         try:
             result = subprocess.run(
-                ['docker', 'stats', '--no-stream', '--format',
-                 '{{.Name}}\t{{.CPUPerc}}\t{{.MemUsage}}'],
+                ['docker', 'ps', '--no-trunc', '--filter', f'name={self.container_filter}',
+                 '--format', '{{.ID}}\t{{.Names}}'],
                 capture_output=True, text=True, timeout=5.0
             )
-            if result.returncode != 0:
-                return None
+        except (OSError, subprocess.TimeoutExpired):
+            return {}
+        if result.returncode != 0:
+            return {}
 
-            sample = {
-                'timestamp': time.time(),
-                'containers': {}
+        cgroups = {}
+        for line in result.stdout.splitlines():
+            container_id, _, name = line.partition('\t')
+            for pattern in self.CGROUP_DIRS:
+                path = os.path.join(self.CGROUP_ROOT, pattern.format(id=container_id))
+                if os.access(os.path.join(path, 'memory.current'), os.R_OK):
+                    cgroups[name] = path
+                    break
+            else:
+                return {}
+        return cgroups
+
+    def _sysfs_collect(self) -> Optional[Dict[str, Any]]:
+        """Read memory and CPU usage straight from each container's cgroup
+
+        CPU percent is the usage_usec delta since the previous read over the
+        wall time elapsed, so 100 means one full core, as in docker stats.
+        """
+        containers = {}
+        for name, path in self._cgroups.items():
+            try:
+                with open(os.path.join(path, 'memory.current'), 'rb') as f:
+                    mem_bytes = int(f.read())
+                with open(os.path.join(path, 'memory.stat'), 'rb') as f:
+                    mem_bytes -= next((int(line.split()[1]) for line in f
+                                       if line.startswith(b'inactive_file ')), 0)
+                with open(os.path.join(path, 'cpu.stat'), 'rb') as f:
+                    usage_usec = next(int(line.split()[1]) for line in f
+                                      if line.startswith(b'usage_usec '))
+            except (OSError, ValueError, StopIteration):
+                continue  # Container stopped since start()
+            now = time.monotonic()
+            previous = self._cpu_prev.get(name)
+            self._cpu_prev[name] = (usage_usec, now)
+            if previous is None:
+                continue
+            elapsed_usec = (now - previous[1]) * 1e6
+            containers[name] = {
+                'cpu_percent': (usage_usec - previous[0]) / elapsed_usec * 100 if elapsed_usec > 0 else 0.0,
+                'mem_usage_mb': mem_bytes / (1024 * 1024)
             }
 
-            for line in result.stdout.strip().split('\n'):
-                if not line or self.container_filter not in line:
-                    continue
-                parts = line.split('\t')
-                if len(parts) >= 3:
-                    name = parts[0]
-                    cpu = parts[1].replace('%', '')
-                    mem = parts[2].split('/')[0].strip()
-
-                    # Parse memory (e.g., "50.5MiB" -> 50.5)
-                    mem_mb = 0.0
-                    if 'GiB' in mem:
-                        mem_mb = float(mem.replace('GiB', '')) * 1024
-                    elif 'MiB' in mem:
-                        mem_mb = float(mem.replace('MiB', ''))
-                    elif 'KiB' in mem:
-                        mem_mb = float(mem.replace('KiB', '')) / 1024
-
-                    sample['containers'][name] = {
-                        'cpu_percent': float(cpu) if cpu else 0.0,
-                        'mem_usage_mb': mem_mb
-                    }
-
-            return sample if sample['containers'] else None
-        except Exception:
+        if not containers:
+            return None
+        return {'timestamp': time.time(), 'containers': containers}
+
+    def _read_loop(self):
+        """Fold each line of the streaming output into the latest figures"""
+        for line in self._process.stdout:
+            try:
+                parsed = self._parse_line(line)
+            except Exception:
+                continue  # Silently ignore unparseable lines
+            if parsed:
+                name, stats = parsed
+                with self._lock:
+                    self._latest[name] = stats
+
+    def _choose_source(self) -> bool:
+        """Pick the cheapest available stats source and take its baseline
+
+        Runs on the collector thread, since finding the containers blocks
+        on the docker CLI or the Engine API. Returns False if there is
+        nothing to collect from.
+        """
+        self._cgroups = self._find_cgroups()
+        if self._cgroups:
+            self._sample_source = self._sysfs_collect
+            self._sysfs_collect()  # Baseline CPU counters for the first deltas
+        elif self._find_api_containers():
+            self._api_pool = ThreadPoolExecutor(max_workers=len(self._api_containers))
+            self._sample_source = self._api_collect
+            self._api_collect()  # Baseline CPU counters for the first deltas
+        else:
+            with self._lock:
+                if self._stopped.is_set():
+                    return False
+                try:
+                    self._process = subprocess.Popen(
+                        self.STATS_COMMAND, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+                except OSError:
+                    return False  # No docker CLI; collect nothing, as before
+            self._reader = threading.Thread(target=self._read_loop, daemon=True)
+            self._reader.start()
+        return True
+
+    def _collect_loop(self):
+        """Background collection loop"""
+        try:
+            if not self._choose_source():
+                return
+            while not self._stopped.wait(self.sample_interval):
+                try:
+                    sample = self._sample_source()
+                except Exception:
+                    continue  # Silently ignore collection errors
+                if sample:
+                    self.stats.append(sample)
+        finally:
+            # Shut the Engine API pool down here rather than in stop(), which
+            # may return before a slow discovery has created it
+            if self._api_pool:
+                self._api_pool.shutdown(wait=False)
+
+    def _collect_sample(self) -> Optional[Dict[str, Any]]:
+        """Take the containers refreshed since the previous sample"""
+        with self._lock:
+            containers, self._latest = self._latest, {}
+        if not containers:
             return None
+        return {'timestamp': time.time(), 'containers': containers}
+
+    def _parse_line(self, line: bytes) -> Optional[Tuple[str, Dict[str, float]]]:
+        """Parse one output line into (name, figures); only the name is decoded"""
+        line = self._ANSI_RE.sub(b'', line).strip()
+        if not line or self._filter_bytes not in line:
+            return None
+        parts = line.split(b'\t')
+        if len(parts) < 3:
+            return None
+        name = parts[0].decode()
+        cpu = parts[1].strip()[:-1]  # Drop the trailing '%'
+
+        # Parse memory (e.g., b"50.5MiB / 1GiB" -> 50.5)
+        match = self._MEM_RE.match(parts[2])
+        mem_mb = float(match.group(1)) * self._MEM_MULT[match.group(2)] if match else 0.0
+
+        return name, {
+            'cpu_percent': float(cpu) if cpu else 0.0,
+            'mem_usage_mb': mem_mb
+        }
 
 
 class SMTPLoadGenerator:
     """Generates SMTP load for stress testing"""
 
-    def __init__(self, servers: List[str], port: int = 2525):
+    def __init__(self, servers: List[str], port: int = 2525, messages_per_connection: int = 100,
+                 pipelining: bool = True):
         self.servers = servers
         self.port = port
+        self.messages_per_connection = messages_per_connection
+        # Pipeline the envelope when the server advertises it; False forces
+        # one round trip per command for comparison runs
+        self.pipelining = pipelining
         self.metrics = TestMetrics()
-        self.lock = asyncio.Lock()
+        self._body_cache: Dict[int, bytes] = {}
+        # Body -> (body + END_OF_DATA, body + END_OF_DATA_QUIT)
+        self._payload_cache: Dict[bytes, Tuple[bytes, bytes]] = {}
+        # Server name -> IP address, filled in once per test by _resolve_servers
+        self._addresses: Dict[str, str] = {}
+        # Kinds of failure already logged as a warning; repeats go to debug
+        self._reported_failures: Set[Any] = set()
+
+    def _report_failure(self, kind: Any, message: str, *args):
+        """Log a failed send, as a warning the first time each kind occurs
+
+        Later failures of the same kind are only logged at debug level, so a
+        server going down doesn't turn stdout into the bottleneck; the
+        summary's error breakdown still counts every one.
+        """
+        if kind in self._reported_failures:
+            logger.debug(message, *args)
+        else:
+            self._reported_failures.add(kind)
+            logger.warning(message + ' (repeats are logged with --verbose)', *args)
 
     def _classify_error(self, error: Exception) -> ErrorType:
-        """Classify an exception into an error type"""
-        error_str = str(error).lower()
+        """Classify an exception into an error type
+
+        Socket errors are told apart by exception type (OSError maps errno
+        to these subclasses itself); only anything else has its message
+        searched, for an SMTP error code.
+        """
         if isinstance(error, asyncio.TimeoutError):
             return ErrorType.TIMEOUT
-        elif 'connection refused' in error_str:
+        elif isinstance(error, ConnectionRefusedError):
             return ErrorType.CONNECTION_REFUSED
-        elif 'connection reset' in error_str or 'errno 104' in error_str:
+        elif isinstance(error, ConnectionResetError):
             return ErrorType.CONNECTION_RESET
-        elif any(x in error_str for x in ['500', '501', '503', '550']):
+        elif PROTOCOL_ERROR_RE.search(str(error)):
             return ErrorType.PROTOCOL_ERROR
         else:
             return ErrorType.OTHER
 
-    async def send_smtp_message(self, server: str, message_size: int) -> bool:
+    async def open_session(self, server: str, body_size: int = 0) -> Optional[SMTPSession]:
         """
-        Send a single SMTP message using raw socket connection
-        Returns True on success, False on failure
+        Connect to a server and complete the greeting and EHLO exchange
+        Returns a session ready for transactions, or None if rejected
+
+        Stream buffers are sized to twice the message body so a large body is
+        queued to the transport in one go rather than in flow-control rounds;
+        the kernel send buffer is raised to match for bodies past the default.
         """
-        start_time = time.time()
+        buffer_size = max(MIN_STREAM_BUFFER, body_size * 2)
 
-        try:
-            # Open TCP connection
-            reader, writer = await asyncio.wait_for(
-                asyncio.open_connection(server, self.port),
-                timeout=10.0
-            )
+        # Open TCP connection; a pre-resolved numeric host skips getaddrinfo()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self._addresses.get(server, server), self.port,
+                                    limit=buffer_size),
+            timeout=10.0
+        )
+        writer.transport.set_write_buffer_limits(high=buffer_size)
+        self._tune_socket(writer, buffer_size)
+        session = SMTPSession(reader, writer)
+
+        # Read greeting (220)
+        if not await self._read_status(reader, REPLY_READY, 'Greeting', server):
+            await self.close_session(session, send_quit=False)
+            return None
+
+        # EHLO
+        writer.write(CMD_EHLO)
+        await writer.drain()
+
+        # Read all EHLO responses, noting whether PIPELINING is advertised
+        for line in await self._read_multiline_reply(reader):
+            if line[:3] != REPLY_OK:
+                self._report_failure('EHLO', "EHLO failed on %s: %s", server, line.decode().strip())
+                await self.close_session(session, send_quit=False)
+                return None
+            if self.pipelining and line[4:].strip().upper() == b'PIPELINING':
+                session.pipelining = True
+
+        return session
+
+    async def _resolve_servers(self):
+        """Resolve every server once so each connection doesn't hit the resolver
 
-            # Read greeting (220)
-            greeting = await asyncio.wait_for(reader.readline(), timeout=5.0)
-            if not greeting.startswith(b'220'):
-                print(f"ERROR: Unexpected greeting from {server}: {greeting.decode().strip()}")
-                writer.close()
-                await writer.wait_closed()
-                return False
+        A server that fails to resolve is left as a hostname, so the error
+        still shows up (and is counted) on every message sent to it.
+        """
+        loop = asyncio.get_running_loop()
+        self._addresses = {}
+        for server in self.servers:
+            try:
+                infos = await loop.getaddrinfo(server, self.port, type=socket.SOCK_STREAM)
+            except OSError as e:
+                logger.warning("Could not resolve %s: %s", server, e)
+                continue
+            self._addresses[server] = infos[0][4][0]
+
+    def _tune_socket(self, writer: asyncio.StreamWriter, send_buffer_size: int):
+        """Disable Nagle for the command/reply exchanges and size SO_SNDBUF
+
+        asyncio already sets TCP_NODELAY on new connections, but not every
+        loop implementation does. SO_SNDBUF is left alone for small bodies
+        so the kernel's send-buffer autotuning stays in effect.
+        """
+        sock = writer.get_extra_info('socket')
+        if sock is None:
+            return
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if send_buffer_size > MIN_STREAM_BUFFER:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, send_buffer_size)
+        except OSError:
+            pass  # Best effort; the defaults still work
 
-            # EHLO
-            writer.write(b'EHLO loadgen.test\r\n')
-            await writer.drain()
+    async def _read_multiline_reply(self, reader: asyncio.StreamReader) -> List[bytes]:
+        """
+        Read a complete, possibly multi-line, SMTP reply and split it into lines
 
-            # Read all EHLO responses
+        Pulls whatever the stream has buffered instead of one readline() per
+        line, so a typical EHLO reply costs a single await. Only safe where the
+        server sends nothing after the reply until we write again.
+        """
+        buf = bytearray()
+        async with asyncio.timeout(REPLY_TIMEOUT):
             while True:
-                line = await asyncio.wait_for(reader.readline(), timeout=5.0)
-                if not line.startswith(b'250'):
-                    print(f"ERROR: EHLO failed on {server}: {line.decode().strip()}")
-                    writer.close()
-                    await writer.wait_closed()
-                    return False
-                if line.startswith(b'250 '):  # Last line starts with "250 " (with space)
-                    break
+                chunk = await reader.read(4096)
+                if not chunk:
+                    raise ConnectionResetError("Connection closed during SMTP reply")
+                buf += chunk
+                if buf.endswith(b'\r\n'):
+                    # The reply is complete once its last line is not a "250-" continuation
+                    last = buf.rfind(b'\r\n', 0, len(buf) - 2)
+                    last = last + 2 if last >= 0 else 0
+                    if buf[last + 3:last + 4] != b'-':
+                        return bytes(buf).split(b'\r\n')[:-1]
+
+    async def _read_status(self, reader: asyncio.StreamReader, expected: bytes,
+                           command: str, server: str, reused: bool = False) -> bool:
+        """Read a single-line reply and check its code, reporting a mismatch
+
+        With reused, a closed connection, 421 or failed RSET raises SessionExpired.
+        """
+        async with asyncio.timeout(REPLY_TIMEOUT):
+            response = await reader.readline()
+        if response[:3] == expected:
+            return True
+        if reused and (not response or response[:3] == REPLY_CLOSING or command == 'RSET'):
+            reason = response.decode().strip() or 'connection closed'
+            raise SessionExpired(f"{server} closed the session: {reason}")
+        self._report_failure(command, "%s failed on %s: %s", command, server,
+                             response.decode().strip())
+        return False
+
+    async def send_one(self, session: SMTPSession, server: str, message_body: bytes,
+                       quit_after: bool = False) -> int:
+        """
+        Run one MAIL FROM / RCPT TO / DATA transaction on an open session
+        Returns the number of body bytes accepted, or 0 if the server rejected it
+
+        When the server supports PIPELINING (RFC 2920) the envelope is sent as
+        a single group, and with quit_after the QUIT rides along with the
+        end-of-data marker; close_session then only collects its reply.
+
+        On a session that has already carried a message, losing the
+        connection before the envelope is accepted raises SessionExpired.
+        """
+        # Bound to locals: this runs for every message, so skip the repeated
+        # attribute and global lookups
+        read_status = self._read_status
+        reader = session.reader
+        write = session.writer.write
+        drain = session.writer.drain
+        reused = session.messages_sent > 0
+
+        try:
+            if session.pipelining:
+                if session.reset_pending:
+                    write(PIPELINED_RESET_ENVELOPE)
+                    expected = PIPELINED_RESET_REPLIES
+                    session.reset_pending = False
+                else:
+                    write(PIPELINED_ENVELOPE)
+                    expected = PIPELINED_REPLIES
+                await drain()
+                for command, code in expected:
+                    if not await read_status(reader, code, command, server, reused):
+                        return 0
+            else:
+                # MAIL FROM
+                write(CMD_MAIL_FROM)
+                await drain()
+                if not await read_status(reader, REPLY_OK, 'MAIL FROM', server, reused):
+                    return 0
+
+                # RCPT TO
+                write(CMD_RCPT_TO)
+                await drain()
+                if not await read_status(reader, REPLY_OK, 'RCPT TO', server, reused):
+                    return 0
+
+                # DATA
+                write(CMD_DATA)
+                await drain()
+                if not await read_status(reader, REPLY_START_DATA, 'DATA', server, reused):
+                    return 0
+        except ConnectionError as e:
+            if not reused:
+                raise
+            raise SessionExpired(f"{server} closed the session: {e}") from e
+
+        # Body and terminator go out as one pre-joined buffer and one drain
+        terminated, terminated_quit = self._get_payloads(message_body)
+        if quit_after and session.pipelining:
+            write(terminated_quit)
+            session.quit_sent = True
+        else:
+            write(terminated)
+        await drain()
+
+        if not await read_status(reader, REPLY_OK, 'Message delivery', server):
+            return 0
+
+        return len(message_body)
 
-            # MAIL FROM
-            writer.write(b'MAIL FROM:<loadgen@test.local>\r\n')
-            await writer.drain()
-            response = await asyncio.wait_for(reader.readline(), timeout=5.0)
-            if not response.startswith(b'250'):
-                print(f"ERROR: MAIL FROM failed on {server}: {response.decode().strip()}")
-                writer.close()
-                await writer.wait_closed()
-                return False
-
-            # RCPT TO
-            writer.write(b'RCPT TO:<test@example.com>\r\n')
-            await writer.drain()
-            response = await asyncio.wait_for(reader.readline(), timeout=5.0)
-            if not response.startswith(b'250'):
-                print(f"ERROR: RCPT TO failed on {server}: {response.decode().strip()}")
-                writer.close()
-                await writer.wait_closed()
-                return False
-
-            # DATA
-            writer.write(b'DATA\r\n')
-            await writer.drain()
-            response = await asyncio.wait_for(reader.readline(), timeout=5.0)
-            if not response.startswith(b'354'):
-                print(f"ERROR: DATA failed on {server}: {response.decode().strip()}")
-                writer.close()
-                await writer.wait_closed()
-                return False
-
-            # Generate and send message body
-            message_body = self.generate_message_body(message_size)
-
-            # Send the message content
-            writer.write(message_body.encode('utf-8'))
-            await writer.drain()
-
-            # Send terminator
-            writer.write(b'.\r\n')
-            await writer.drain()
-
-            response = await asyncio.wait_for(reader.readline(), timeout=5.0)
-            if not response.startswith(b'250'):
-                print(f"ERROR: Message not accepted by {server}: {response.decode().strip()}")
-                writer.close()
-                await writer.wait_closed()
-                return False
-
-            # QUIT
-            writer.write(b'QUIT\r\n')
-            await writer.drain()
-            await asyncio.wait_for(reader.readline(), timeout=5.0)
-
-            writer.close()
-            await writer.wait_closed()
-
-            # Record metrics
-            response_time = time.time() - start_time
-            async with self.lock:
-                self.metrics.successful_messages += 1
-                self.metrics.total_bytes_sent += len(message_body)
-                self.metrics.response_times.append(response_time)
+    async def reset_session(self, session: SMTPSession) -> bool:
+        """Send RSET so the session is clean for the next transaction; never raises
 
+        With PIPELINING the RSET is deferred and sent at the head of the next
+        envelope group instead of costing its own round trip.
+        """
+        if session.pipelining:
+            session.reset_pending = True
             return True
+        try:
+            session.writer.write(CMD_RSET)
+            await session.writer.drain()
+            async with asyncio.timeout(REPLY_TIMEOUT):
+                response = await session.reader.readline()
+            return response[:3] == REPLY_OK
+        except Exception:
+            return False
+
+    async def close_session(self, session: SMTPSession, send_quit: bool = True):
+        """Close a session, optionally saying QUIT first; never raises"""
+        try:
+            if send_quit:
+                if not session.quit_sent:
+                    session.writer.write(CMD_QUIT)
+                    await session.writer.drain()
+                async with asyncio.timeout(REPLY_TIMEOUT):
+                    await session.reader.readline()
+        except Exception:
+            pass
+        finally:
+            session.writer.close()
+            try:
+                await session.writer.wait_closed()
+            except Exception:
+                pass
+
+    async def send_on_session(self, sessions: Dict[str, SMTPSession], server: str,
+                              message_body: bytes) -> SendResult:
+        """
+        Send a message over the caller's persistent session to a server
+
+        Sessions are opened lazily, RSET between transactions, and recycled
+        after messages_per_connection sends or SESSION_IDLE_TIMEOUT unused.
+        Any rejection or I/O error drops the session so the next message
+        reconnects from scratch; if a reused session turns out to have been
+        closed by the server, the message is retried once on a fresh one.
+        """
+        start = time.perf_counter()
+
+        try:
+            session = sessions.get(server)
+            if session is not None:
+                if start - session.last_used > SESSION_IDLE_TIMEOUT:
+                    await self._drop_session(sessions, server)
+                else:
+                    try:
+                        return await self._send_transaction(sessions, session, server,
+                                                            message_body, start)
+                    except SessionExpired as e:
+                        logger.debug("Retrying on a new session: %s", e)
+                        await self._drop_session(sessions, server)
+
+            session = await self.open_session(server, len(message_body))
+            if session is None:
+                return (False, 0, time.perf_counter() - start, None)
+            sessions[server] = session
+            return await self._send_transaction(sessions, session, server, message_body, start)
 
         except asyncio.TimeoutError as e:
-            async with self.lock:
-                self.metrics.connection_errors += 1
-                self.metrics.record_error(ErrorType.TIMEOUT)
-            print(f"ERROR: Timeout connecting to {server}")
-            return False
+            await self._drop_session(sessions, server)
+            self._report_failure(ErrorType.TIMEOUT, "Timeout connecting to %s", server)
+            return (False, 0, time.perf_counter() - start, ErrorType.TIMEOUT)
         except Exception as e:
-            error_type = self._classify_error(e)
-            async with self.lock:
-                self.metrics.connection_errors += 1
-                self.metrics.record_error(error_type)
-            print(f"ERROR: Exception sending to {server}: {e}")
-            return False
+            await self._drop_session(sessions, server)
+            error_kind = self._classify_error(e)
+            self._report_failure(error_kind, "Exception sending to %s: %s", server, e)
+            return (False, 0, time.perf_counter() - start, error_kind)
 
-    def generate_message_body(self, size_bytes: int) -> str:
-        """Generate a message body of approximately the specified size
+    async def _send_transaction(self, sessions: Dict[str, SMTPSession], session: SMTPSession,
+                                server: str, message_body: bytes, start: float) -> SendResult:
+        """Send one message on a session in sessions and leave it ready for the next
+
+        Drops, closes or resets the session according to the outcome.
+        """
+        last = session.messages_sent + 1 >= self.messages_per_connection
+        bytes_sent = await self.send_one(session, server, message_body, quit_after=last)
+        elapsed = time.perf_counter() - start
+        if not bytes_sent:
+            await self._drop_session(sessions, server)
+            return (False, 0, elapsed, None)
+
+        session.messages_sent += 1
+        if last:
+            del sessions[server]
+            await self.close_session(session)
+        elif not await self.reset_session(session):
+            await self._drop_session(sessions, server)
+        else:
+            session.last_used = time.perf_counter()
+
+        return (True, bytes_sent, elapsed, None)
+
+    async def _drop_session(self, sessions: Dict[str, SMTPSession], server: str):
+        """Forget and close a session that can no longer be trusted"""
+        session = sessions.pop(server, None)
+        if session is not None:
+            await self.close_session(session, send_quit=False)
+
+    def generate_message_body(self, size_bytes: int) -> bytes:
+        """Generate a wire-ready message body of approximately the specified size
 
         Note: Lines are kept under 70 characters to stay well within the
         server's 998-byte text line limit per RFC 5321.
         """
         # Simple fixed message for testing - minimal variability
         message = (
-            "From: loadgen@test.local\r\n"
-            "To: test@example.com\r\n"
-            "Subject: Load Test Message\r\n"
-            "\r\n"
-            "This is a test message from the load generator.\r\n"
-            "It contains multiple lines of text.\r\n"
-            "Each line is kept short for compatibility.\r\n"
+            b"From: loadgen@test.local\r\n"
+            b"To: test@example.com\r\n"
+            b"Subject: Load Test Message\r\n"
+            b"\r\n"
+            b"This is a test message from the load generator.\r\n"
+            b"It contains multiple lines of text.\r\n"
+            b"Each line is kept short for compatibility.\r\n"
         )
 
-        # Pad to desired size with short lines (under 70 chars each)
-        line_num = 0
-        while len(message) < size_bytes - 100:  # Leave room for safety
-            line_num += 1
-            # Keep lines very short - under 50 characters
-            message += "Line {} of test message body content.\r\n".format(line_num)
-
-        return message
-
-    async def run_worker(self, worker_id: int, num_messages: int, message_size: int):
-        """Worker coroutine that sends messages"""
-        for i in range(num_messages):
-            # Round-robin server selection
-            server = self.servers[i % len(self.servers)]
-
-            async with self.lock:
-                self.metrics.total_messages += 1
-
-            success = await self.send_smtp_message(server, message_size)
-
-            if not success:
-                async with self.lock:
-                    self.metrics.failed_messages += 1
+        # Pad to desired size with whole copies of the filler tile, then as
+        # many of its lines as it takes to reach the target
+        padding = (size_bytes - 100) - len(message)  # Leave room for safety
+        if padding <= 0:
+            return message
+        repeats, remainder = divmod(padding, len(FILLER_TILE))
+        tail = FILLER_TILE[:FILLER_TILE.index(b'\n', remainder - 1) + 1] if remainder else b''
+        return message + FILLER_TILE * repeats + tail
+
+    def _get_payloads(self, message_body: bytes) -> Tuple[bytes, bytes]:
+        """Return the body joined with END_OF_DATA and with END_OF_DATA_QUIT, building them only once"""
+        payloads = self._payload_cache.get(message_body)
+        if payloads is None:
+            payloads = self._payload_cache[message_body] = (
+                message_body + END_OF_DATA, message_body + END_OF_DATA_QUIT)
+        return payloads
+
+    def _get_body_bytes(self, size_bytes: int) -> bytes:
+        """Return the message body for a size, building it only once"""
+        body = self._body_cache.get(size_bytes)
+        if body is None:
+            body = self._body_cache[size_bytes] = self.generate_message_body(size_bytes)
+        return body
+
+    async def run_worker(self, worker_id: int, queue: asyncio.Queue, message_body: bytes,
+                         delay: float = 0.0) -> TestMetrics:
+        """Worker coroutine that sends one message per server taken from the queue
+
+        Runs until it takes a None sentinel, pausing delay seconds after each
+        message when it is positive. Results are counted into a TestMetrics
+        owned by this worker alone, which the caller merges once all workers
+        finish, so no locking is needed.
+        """
+        local = TestMetrics()
 
-            # Small delay to prevent overwhelming the servers
-            await asyncio.sleep(0.01)
+        # One persistent session per server, reused across messages
+        sessions: Dict[str, SMTPSession] = {}
 
-    async def run_burst_test(self, total_messages: int, concurrent_workers: int,
-                             message_size: int, collect_docker_stats: bool = False):
-        """Run a burst test with concurrent workers"""
+        try:
+            while (server := await queue.get()) is not None:
+                local.record_result(await self.send_on_session(sessions, server, message_body))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        finally:
+            for session in sessions.values():
+                await self.close_session(session)
+
+        return local
+
+    def announce_burst_test(self, total_messages: int, concurrent_workers: int,
+                            message_size: int, collect_docker_stats: bool = False):
+        """Print the banner describing a burst test"""
         print(f"Starting burst test: {total_messages} messages, {concurrent_workers} workers")
         print(f"Target servers: {', '.join(self.servers)}")
         print(f"Message size: {message_size} bytes")
@@ -439,8 +1115,19 @@ class SMTPLoadGenerator:
             print("Docker stats collection: ENABLED")
         print("-" * 60)
 
+    async def run_burst_test(self, total_messages: int, concurrent_workers: int,
+                             message_size: int, collect_docker_stats: bool = False,
+                             per_worker_delay: float = 0.0, announce: bool = True):
+        """Run a burst test with concurrent workers, each pausing
+        per_worker_delay seconds between messages (default: no pause)"""
+        if announce:
+            self.announce_burst_test(total_messages, concurrent_workers, message_size,
+                                     collect_docker_stats)
+
+        message_body = self._get_body_bytes(message_size)
+        await self._resolve_servers()
         self.metrics = TestMetrics()
-        self.metrics.start_time = time.time()
+        self.metrics.mark_start()
 
         # Start docker stats collection if enabled
         stats_collector = None
@@ -448,18 +1135,26 @@ class SMTPLoadGenerator:
             stats_collector = DockerStatsCollector()
             stats_collector.start()
 
-        messages_per_worker = total_messages // concurrent_workers
-        remainder = total_messages % concurrent_workers
+        # Workers pull servers from a bounded queue, so faster workers take
+        # more of the load and each keeps its sessions open while draining it
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrent_workers * 2)
+
+        async def produce():
+            for i in range(total_messages):
+                # Round-robin server selection
+                await queue.put(self.servers[i % len(self.servers)])
+            for _ in range(concurrent_workers):
+                await queue.put(None)
 
-        tasks = []
-        for i in range(concurrent_workers):
-            worker_messages = messages_per_worker + (1 if i < remainder else 0)
-            task = asyncio.create_task(self.run_worker(i, worker_messages, message_size))
-            tasks.append(task)
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(produce())
+            workers = [tg.create_task(self.run_worker(i, queue, message_body, per_worker_delay))
+                       for i in range(concurrent_workers)]
 
-        await asyncio.gather(*tasks)
+        for worker in workers:
+            self.metrics.merge(worker.result())
 
-        self.metrics.end_time = time.time()
+        self.metrics.mark_end()
 
         # Stop docker stats collection
         if stats_collector:
@@ -467,18 +1162,40 @@ class SMTPLoadGenerator:
 
         return self.metrics
 
-    async def run_sustained_test(self, duration_seconds: int, messages_per_second: int,
-                                 message_size: int, collect_docker_stats: bool = False):
-        """Run a sustained load test for a specified duration"""
+    def announce_sustained_test(self, duration_seconds: int, messages_per_second: int,
+                                message_size: int, collect_docker_stats: bool = False,
+                                max_inflight: Optional[int] = None):
+        """Print the banner describing a sustained test"""
+        if max_inflight is None:
+            max_inflight = max(1, messages_per_second * 2)
+
         print(f"Starting sustained test: {duration_seconds}s duration, {messages_per_second} msg/s")
         print(f"Target servers: {', '.join(self.servers)}")
         print(f"Message size: {message_size} bytes")
+        print(f"Max in-flight: {max_inflight}")
         if collect_docker_stats:
             print("Docker stats collection: ENABLED")
         print("-" * 60)
 
+    async def run_sustained_test(self, duration_seconds: int, messages_per_second: int,
+                                 message_size: int, collect_docker_stats: bool = False,
+                                 max_inflight: Optional[int] = None, announce: bool = True):
+        """Run a sustained load test for a specified duration
+
+        At most max_inflight sends (default: two seconds' worth at the target
+        rate) are outstanding at once; a send that comes due while that many
+        are still running is dropped and counted rather than queued.
+        """
+        if max_inflight is None:
+            max_inflight = max(1, messages_per_second * 2)
+        if announce:
+            self.announce_sustained_test(duration_seconds, messages_per_second, message_size,
+                                         collect_docker_stats, max_inflight)
+
+        message_body = self._get_body_bytes(message_size)
+        await self._resolve_servers()
         self.metrics = TestMetrics()
-        self.metrics.start_time = time.time()
+        self.metrics.mark_start()
 
         # Start docker stats collection if enabled
         stats_collector = None
@@ -486,26 +1203,68 @@ class SMTPLoadGenerator:
             stats_collector = DockerStatsCollector()
             stats_collector.start()
 
-        end_time = time.time() + duration_seconds
+        # Pace sends against absolute deadlines on the loop's monotonic clock,
+        # so scheduling jitter and send overhead don't accumulate into drift
+        loop = asyncio.get_running_loop()
         interval = 1.0 / messages_per_second
+        start = loop.time()
+        end_time = start + duration_seconds
+
+        # Each send folds its outcome into the metrics as soon as it finishes,
+        # so memory stays flat however long the run; everything runs on this
+        # one loop, so no lock is needed
+        metrics = self.metrics
+        inflight = asyncio.Semaphore(max_inflight)
+        pending: Set[asyncio.Task] = set()
+        dropped = 0
+
+        # Sessions not currently sending, per server, oldest first; a send
+        # borrows the most recently used one (or opens a new one) and hands it
+        # back if it is still usable afterwards
+        idle: Dict[str, List[SMTPSession]] = {server: [] for server in self.servers}
+
+        async def send_and_record(server: str):
+            async with inflight:
+                pool = idle[server]
+                # Sessions left over from a burst of concurrency age out here
+                # rather than lingering until the server times them out
+                now = time.perf_counter()
+                while pool and now - pool[0].last_used > SESSION_IDLE_TIMEOUT:
+                    await self.close_session(pool.pop(0), send_quit=False)
+                sessions: Dict[str, SMTPSession] = {}
+                if pool:
+                    sessions[server] = pool.pop()
+                metrics.record_result(await self.send_on_session(sessions, server, message_body))
+                if server in sessions:
+                    idle[server].append(sessions.pop(server))
+
+        for message_count in itertools.count():
+            deadline = start + message_count * interval
+            if deadline >= end_time:
+                break
+
+            # Don't wait for earlier sends, just sleep until this one is due
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+
+            # Backpressure: shed load instead of piling up tasks behind a slow server
+            if inflight.locked():
+                dropped += 1
+                continue
 
-        message_count = 0
-        while time.time() < end_time:
             server = self.servers[message_count % len(self.servers)]
+            task = asyncio.create_task(send_and_record(server))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
 
-            async with self.lock:
-                self.metrics.total_messages += 1
+        # Wait for the sends still in flight instead of a fixed grace period
+        await asyncio.gather(*pending, return_exceptions=True)
+        for sessions in idle.values():
+            for session in sessions:
+                await self.close_session(session)
 
-            task = asyncio.create_task(self.send_smtp_message(server, message_size))
-            message_count += 1
+        self.metrics.dropped_messages = dropped
 
-            # Don't wait for completion, just throttle sending rate
-            await asyncio.sleep(interval)
-
-        # Wait a bit for remaining messages to complete
-        await asyncio.sleep(5)
-
-        self.metrics.end_time = time.time()
+        self.metrics.mark_end()
 
         # Stop docker stats collection
         if stats_collector:
@@ -514,6 +1273,91 @@ class SMTPLoadGenerator:
         return self.metrics
 
 
+def configure_logging(level: int):
+    """Log to stderr as "LEVEL: message" lines, at level for this module
+    and the default WARNING for libraries such as asyncio"""
+    logging.basicConfig(format='%(levelname)s: %(message)s')
+    logger.setLevel(level)
+
+
+# Event loop used unless --loop says otherwise
+DEFAULT_EVENT_LOOP = 'uvloop' if uvloop is not None else 'asyncio'
+
+
+def run_event_loop(coro, event_loop: str = DEFAULT_EVENT_LOOP):
+    """Run a coroutine to completion on the chosen event loop
+
+    'uvloop' uses its libuv-based loop, 'asyncio' the stock selector loop.
+    Either way, on Python 3.12+ tasks that finish without blocking skip a
+    trip through the scheduler.
+    """
+    if event_loop == 'uvloop':
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    async def runner():
+        eager_task_factory = getattr(asyncio, 'eager_task_factory', None)
+        if eager_task_factory is not None:
+            asyncio.get_running_loop().set_task_factory(eager_task_factory)
+        return await coro
+
+    return asyncio.run(runner())
+
+
+def _split_evenly(total: int, parts: int) -> List[int]:
+    """Split total into parts integers that differ by at most one"""
+    share, remainder = divmod(total, parts)
+    return [share + (1 if i < remainder else 0) for i in range(parts)]
+
+
+def _run_shard(generator_args: Dict[str, Any], mode: str, test_args: Dict[str, Any],
+               event_loop: str, log_level: int) -> TestMetrics:
+    """Entry point for one worker process: run its share of the test"""
+    configure_logging(log_level)  # Spawned processes start unconfigured
+    generator = SMTPLoadGenerator(**generator_args)
+    if mode == 'burst':
+        return run_event_loop(generator.run_burst_test(**test_args), event_loop)
+    return run_event_loop(generator.run_sustained_test(**test_args), event_loop)
+
+
+def run_in_processes(generator_args: Dict[str, Any], mode: str, shards: List[Dict[str, Any]],
+                     collect_docker_stats: bool = False,
+                     event_loop: str = DEFAULT_EVENT_LOOP,
+                     log_level: int = logging.WARNING) -> TestMetrics:
+    """
+    Run one shard of the test per process, each on its own event loop
+
+    A single event loop is bound to one core; spreading shards across
+    processes lets the generator use them all. The partial metrics are
+    merged here, and Docker stats are sampled once by this process.
+    """
+    print(f"Running across {len(shards)} processes")
+
+    stats_collector = None
+    if collect_docker_stats:
+        stats_collector = DockerStatsCollector()
+        stats_collector.start()
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as pool:
+        futures = [pool.submit(_run_shard, generator_args, mode, shard, event_loop, log_level)
+                   for shard in shards]
+        partials = [future.result() for future in futures]
+
+    metrics = TestMetrics()
+    for partial in partials:
+        metrics.merge(partial)
+    metrics.start_time = min(partial.start_time for partial in partials)
+    metrics.end_time = max(partial.end_time for partial in partials)
+    # perf_counter() is system-wide, so readings from the shards compare
+    metrics.start_clock = min(partial.start_clock for partial in partials)
+    metrics.end_clock = max(partial.end_clock for partial in partials)
+
+    if stats_collector:
+        metrics.docker_stats = stats_collector.stop()
+
+    return metrics
+
+
 def print_metrics(metrics: TestMetrics):
     """Print formatted metrics with latency percentiles"""
     print("\n" + "=" * 60)
@@ -523,6 +1367,8 @@ def print_metrics(metrics: TestMetrics):
     print(f"Total Messages:        {metrics.total_messages}")
     print(f"Successful:            {metrics.successful_messages}")
     print(f"Failed:                {metrics.failed_messages}")
+    if metrics.dropped_messages:
+        print(f"Dropped (saturated):   {metrics.dropped_messages}")
     print(f"Connection Errors:     {metrics.connection_errors}")
     success_rate = (metrics.successful_messages/metrics.total_messages*100) if metrics.total_messages > 0 else 0
     print(f"Success Rate:          {success_rate:.2f}%")
@@ -576,9 +1422,34 @@ def print_metrics(metrics: TestMetrics):
               help='Message size: small(1KB), medium(10KB), large(100KB), xlarge(1MB)')
 @click.option('--output', '-o', help='Output file for JSON results')
 @click.option('--docker-stats', is_flag=True, help='Collect Docker container stats during test')
-def main(servers, port, mode, messages, workers, duration, rate, size, output, docker_stats):
+@click.option('--messages-per-connection', type=click.IntRange(min=1), default=100,
+              help='Messages sent per SMTP session before reconnecting (default: 100)')
+@click.option('--max-inflight', type=click.IntRange(min=1), default=None,
+              help='Maximum concurrent sends before new ones are dropped (sustained mode, default: 2x rate)')
+@click.option('--processes', '-P', type=click.IntRange(min=1), default=1,
+              help='Generator processes to spread the workers or rate across (default: 1)')
+@click.option('--pipelining/--no-pipelining', default=True,
+              help='Pipeline the envelope when the server advertises PIPELINING (default: on)')
+@click.option('--per-worker-delay', type=click.FloatRange(min=0.0), default=0.0,
+              help='Seconds each worker pauses after every message (burst mode, default: 0)')
+@click.option('--loop', 'event_loop', type=click.Choice(['uvloop', 'asyncio']),
+              default=DEFAULT_EVENT_LOOP, show_default=True,
+              help='Event loop implementation to run the generator on')
+@click.option('--verbose', '-v', is_flag=True, help='Log every failed message, not just the first of each kind')
+@click.option('--quiet', '-q', is_flag=True, help='Only log errors, not per-message warnings')
+def main(servers, port, mode, messages, workers, duration, rate, size, output, docker_stats,
+         messages_per_connection, max_inflight, processes, pipelining, per_worker_delay,
+         event_loop, verbose, quiet):
     """PrixFixe SMTP Load Generator - Stress test SMTP servers"""
 
+    if verbose and quiet:
+        raise click.UsageError('--verbose and --quiet are mutually exclusive')
+    log_level = logging.DEBUG if verbose else logging.ERROR if quiet else logging.WARNING
+    configure_logging(log_level)
+
+    if event_loop == 'uvloop' and uvloop is None:
+        raise click.BadParameter('uvloop is not installed', param_hint='--loop')
+
     # Parse servers
     server_list = [s.strip() for s in servers.split(',')]
 
@@ -591,18 +1462,54 @@ def main(servers, port, mode, messages, workers, duration, rate, size, output, d
     }
     message_size = size_map[size]
 
-    # Create load generator
-    generator = SMTPLoadGenerator(server_list, port)
+    generator_args = {
+        'servers': server_list,
+        'port': port,
+        'messages_per_connection': messages_per_connection,
+        'pipelining': pipelining,
+    }
 
     # Run test
-    async def run_test():
+    def run_test() -> TestMetrics:
+        if mode == 'burst':
+            shard_count = min(processes, workers)
+        else:
+            shard_count = min(processes, rate)
+
+        if shard_count == 1:
+            generator = SMTPLoadGenerator(**generator_args)
+            if mode == 'burst':
+                return run_event_loop(generator.run_burst_test(
+                    messages, workers, message_size, docker_stats, per_worker_delay), event_loop)
+            return run_event_loop(generator.run_sustained_test(
+                duration, rate, message_size, docker_stats, max_inflight), event_loop)
+
+        # Give each process an even share of the workers/messages or of the rate
+        if mode == 'burst':
+            shards = [{'total_messages': n, 'concurrent_workers': w, 'message_size': message_size,
+                       'per_worker_delay': per_worker_delay, 'announce': False}
+                      for n, w in zip(_split_evenly(messages, shard_count),
+                                      _split_evenly(workers, shard_count))]
+        else:
+            if max_inflight:
+                inflight_shares = [max(1, i) for i in _split_evenly(max_inflight, shard_count)]
+            else:
+                inflight_shares = [None] * shard_count
+            shards = [{'duration_seconds': duration, 'messages_per_second': r,
+                       'message_size': message_size, 'max_inflight': i, 'announce': False}
+                      for r, i in zip(_split_evenly(rate, shard_count), inflight_shares)]
+
+        # Shards run quietly; announce the whole test once here
+        announcer = SMTPLoadGenerator(**generator_args)
         if mode == 'burst':
-            return await generator.run_burst_test(messages, workers, message_size, docker_stats)
+            announcer.announce_burst_test(messages, workers, message_size, docker_stats)
         else:
-            return await generator.run_sustained_test(duration, rate, message_size, docker_stats)
+            announcer.announce_sustained_test(duration, rate, message_size, docker_stats,
+                                              max_inflight)
+        return run_in_processes(generator_args, mode, shards, docker_stats, event_loop, log_level)
 
     try:
-        metrics = asyncio.run(run_test())
+        metrics = run_test()
         print_metrics(metrics)
 
         # Save results if output file specified
@@ -613,7 +1520,12 @@ def main(servers, port, mode, messages, workers, duration, rate, size, output, d
                 'port': port,
                 'message_size': message_size,
                 'concurrent_workers': workers if mode == 'burst' else None,
+                'messages_per_connection': messages_per_connection,
+                'per_worker_delay': per_worker_delay if mode == 'burst' else None,
                 'target_rate': rate if mode == 'sustained' else None,
+                'processes': processes,
+                'pipelining': pipelining,
+                'event_loop': event_loop,
                 'metrics': metrics.to_dict()
             }
 